@@ -1,12 +1,27 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.extensions import HamiltonianGate
+from functools import lru_cache
+from qiskit import QuantumCircuit, QuantumRegister, Aer, transpile, assemble
+from qiskit.extensions import UnitaryGate
+from qiskit.extensions.exceptions import ExtensionError
+from qiskit.quantum_info.operators.predicates import is_hermitian_matrix
+from qiskit.quantum_info import Statevector
 from qiskit.circuit.library.standard_gates import CRYGate
+from estimator import RunningEstimator
 
 
-def quantum_fourier_transform(t, vis=False):
+GATE_CACHE_SIZE = 256
+
+
+def clear_gate_cache():
+    for builder in (_quantum_fourier_transform, _eigensystem, _controlled_evolution,
+                    _subroutine_a, _subroutine_b, _subroutine_c, _controlled_subroutine_c):
+        builder.cache_clear()
+
+
+@lru_cache(maxsize=GATE_CACHE_SIZE)
+def _quantum_fourier_transform(t):
     reg = QuantumRegister(t, name='c')
     circ = QuantumCircuit(reg, name='$Q.F.T.$')
     for i in range(t // 2):
@@ -15,10 +30,38 @@ def quantum_fourier_transform(t, vis=False):
         circ.h(i)
         for j in range(i + 1, t):
             circ.cu1(np.pi / (2 ** (j - i)), i, j)
+    return circ, circ.to_gate()
+
+
+def quantum_fourier_transform(t, vis=False):
+    circ, gate = _quantum_fourier_transform(t)
     if vis:
         circ.draw('mpl', reverse_bits=True, style={'fontsize': 6, 'subfontsize': 3})\
             .suptitle("Quantum Fourier Transform", fontsize=16)
-    return circ.to_gate()
+    return gate
+
+
+@lru_cache(maxsize=GATE_CACHE_SIZE)
+def _eigensystem(A):
+    return np.linalg.eigh(np.array(A))
+
+
+@lru_cache(maxsize=GATE_CACHE_SIZE)
+def _controlled_evolution(A, time, power):
+    w, v = _eigensystem(A)
+    U = (v * np.exp(-1j * w * time * power)) @ v.conj().T
+    # Plain unitary on (control, targets) with the control as least significant qubit, since inverting
+    # a controlled UnitaryGate yields a gate of the wrong width
+    cU = np.kron(U, np.diag([0, 1])) + np.kron(np.eye(len(U)), np.diag([1, 0]))
+    return UnitaryGate(cU, label='$cU^{' + str(power) + '}$')
+
+
+def controlled_evolutions(A, time, t):
+    # eigh reads a single triangle, so reject non-Hermitian input like HamiltonianGate did
+    if not is_hermitian_matrix(np.asarray(A, dtype=complex)):
+        raise ExtensionError('Input matrix is not Hermitian.')
+    A = tuple(map(tuple, np.asarray(A)))
+    return [_controlled_evolution(A, time, 2 ** i) for i in range(t)]
 
 
 def quantum_phase_estimation(n, t, unitary, vis=False):
@@ -27,7 +70,11 @@ def quantum_phase_estimation(n, t, unitary, vis=False):
     circ = QuantumCircuit(reg_b, reg_c, name='$Q.P.E.$')
     circ.h(range(n, n + t))
     for i in range(t):
-        circ.append(unitary.control(1).power(2**i), [n + i] + list(range(n)))
+        if isinstance(unitary, list):
+            gate = unitary[i]
+        else:
+            gate = unitary.control(1).power(2**i)
+        circ.append(gate, [n + i] + list(range(n)))
     circ.append(quantum_fourier_transform(t, vis=vis).inverse(), range(n, n + t))
     if vis:
         circ.draw('mpl', reverse_bits=True, style={'fontsize': 6, 'subfontsize': 3})\
@@ -35,48 +82,68 @@ def quantum_phase_estimation(n, t, unitary, vis=False):
     return circ.to_gate()
 
 
-def subroutine_a(t, m, l, k, t0, vis=False):
+@lru_cache(maxsize=GATE_CACHE_SIZE)
+def _subroutine_a(t, m, l, k, t0):
     reg_c = QuantumRegister(t, name='c')
     reg_m = QuantumRegister(m, name='m')
     reg_l = QuantumRegister(l, name='l')
     circ = QuantumCircuit(reg_c, reg_m, reg_l, name='$Sub_A$')
-    vis_temp = vis
     for i in range(t):
-        gate = subroutine_c(m, t - i, l - k, t0, vis=vis_temp)
-        circ.append(gate.control(2), [reg_l[k], reg_c[i]] + [reg_m[j] for j in range(m)])
-        vis_temp = False
+        gate = _controlled_subroutine_c(m, t - i, l - k, t0)
+        circ.append(gate, [reg_l[k], reg_c[i]] + [reg_m[j] for j in range(m)])
+    return circ, circ.to_gate()
+
+
+def subroutine_a(t, m, l, k, t0, vis=False):
+    circ, gate = _subroutine_a(t, m, l, k, t0)
     if vis:
+        subroutine_c(m, t, l - k, t0, vis=True)
         circ.draw('mpl', reverse_bits=True, style={'fontsize': 6, 'subfontsize': 3})\
             .suptitle("Subroutine A", fontsize=16)
-    return circ.to_gate()
+    return gate
 
 
-def subroutine_b(t, m, l, t0, vis=False):
+@lru_cache(maxsize=GATE_CACHE_SIZE)
+def _subroutine_b(t, m, l, t0):
     reg_c = QuantumRegister(t, name='c')
     reg_m = QuantumRegister(m, name='m')
     reg_l = QuantumRegister(l, name='l')
     circ = QuantumCircuit(reg_c, reg_m, reg_l, name='$Sub_B$')
-    vis_temp = vis
     for i in range(l):
-        gate = subroutine_a(t, m, l, i, t0, vis=vis_temp)
-        circ.append(gate, range(t + m + l))
-        vis_temp = False
+        circ.append(subroutine_a(t, m, l, i, t0), range(t + m + l))
+    return circ, circ.to_gate()
+
+
+def subroutine_b(t, m, l, t0, vis=False):
+    circ, gate = _subroutine_b(t, m, l, t0)
     if vis:
+        subroutine_a(t, m, l, 0, t0, vis=True)
         circ.draw('mpl', reverse_bits=True, style={'fontsize': 6, 'subfontsize': 3})\
             .suptitle("Subroutine B", fontsize=16)
-    return circ.to_gate()
+    return gate
 
 
-def subroutine_c(m, u, v, t0, vis=False):
+@lru_cache(maxsize=GATE_CACHE_SIZE)
+def _subroutine_c(m, u, v, t0):
     reg = QuantumRegister(m, name='m')
     circ = QuantumCircuit(reg, name='$Sub_C$')
     t = -t0 / (2 ** (u + v - m))
     for i in range(m):
         circ.rz(t / (2 ** (i + 1)), i)
+    return circ, circ.to_gate()
+
+
+@lru_cache(maxsize=GATE_CACHE_SIZE)
+def _controlled_subroutine_c(m, u, v, t0):
+    return subroutine_c(m, u, v, t0).control(2)
+
+
+def subroutine_c(m, u, v, t0, vis=False):
+    circ, gate = _subroutine_c(m, u, v, t0)
     if vis:
         circ.draw('mpl', reverse_bits=True, style={'fontsize': 6, 'subfontsize': 3})\
             .suptitle("Subroutine C", fontsize=16)
-    return circ.to_gate()
+    return gate
 
 
 def hhl_forward_ckt(n, t, m, l, A, t0, vis=False):
@@ -84,10 +151,9 @@ def hhl_forward_ckt(n, t, m, l, A, t0, vis=False):
     reg_c = QuantumRegister(t, name='c')
     reg_m = QuantumRegister(m, name='m')
     reg_l = QuantumRegister(l, name='l')
-    temp = QuantumCircuit(reg_b, name='$U$')
-    temp.append(HamiltonianGate(A, t0 / (2 ** t)), reg_b)
     circ = QuantumCircuit(reg_b, reg_c, reg_m, reg_l, name='$Fwd$')
-    circ.append(quantum_phase_estimation(n, t, temp.to_gate(), vis=vis), range(n + t))
+    unitary = controlled_evolutions(A, t0 / (2 ** t), t)
+    circ.append(quantum_phase_estimation(n, t, unitary, vis=vis), range(n + t))
     circ.h(reg_m)
     circ.h(reg_l)
     for i in range(m):
@@ -107,10 +173,11 @@ def hhl_circuit(A, t0, theta, size, vis=False):
     reg_l = QuantumRegister(l, name='l')
     ancil = QuantumRegister(1, name='anc')
     circ = QuantumCircuit(reg_b, reg_c, reg_m, reg_l, ancil, name='$HHL$')
-    circ.append(hhl_forward_ckt(n, t, m, l, A, t0, vis=vis), range(sum(size)))
+    forward = hhl_forward_ckt(n, t, m, l, A, t0, vis=vis)
+    circ.append(forward, range(sum(size)))
     for i in range(l):
         circ.append(CRYGate(theta).power(2**i), [reg_l[i], ancil])
-    circ.append(hhl_forward_ckt(n, t, m, l, A, t0).inverse(), range(sum(size)))
+    circ.append(forward.inverse(), range(sum(size)))
     if vis:
         circ.draw('mpl', reverse_bits=True, style={'fontsize': 6, 'subfontsize': 3})\
             .suptitle('HHL Circuit', fontsize=16)
@@ -122,16 +189,125 @@ def ad_hoc_hhl(A, t0, r):
     reg_c = QuantumRegister(4)
     ancil = QuantumRegister(1)
     circ = QuantumCircuit(reg_b, reg_c, ancil)
-    circ.append(quantum_phase_estimation(2, 4, HamiltonianGate(A, t0/16)), range(6))
+    qpe = quantum_phase_estimation(2, 4, controlled_evolutions(A, t0 / 16, 4))
+    circ.append(qpe, range(6))
     circ.swap(reg_c[1], reg_c[3])
     for i in range(4):
         circ.cry(np.pi * (2 ** (4-i-r)), reg_c[i], ancil[0])
         circ.barrier()
     circ.swap(reg_c[1], reg_c[3])
-    circ.append(quantum_phase_estimation(2, 4, HamiltonianGate(A, t0 / 16)).inverse(), range(6))
+    circ.append(qpe.inverse(), range(6))
     return circ
 
 
+def inversion_angles(t, t0, C=None):
+    k = np.arange(2 ** t)
+    signed = np.where(k < 2 ** (t - 1), k, k - 2 ** t)
+    lam = -2 * np.pi * signed / t0
+    if C is None:
+        C = 2 * np.pi / t0
+    ratio = np.divide(C, lam, out=np.zeros(len(lam)), where=lam != 0)
+    return 2 * np.arcsin(np.clip(ratio, -1, 1))
+
+
+def scalable_hhl(A, t0, t, C=None, vis=False):
+    n = int(np.log2(len(A)))
+    reg_b = QuantumRegister(n, name='b')
+    reg_c = QuantumRegister(t, name='c')
+    ancil = QuantumRegister(1, name='anc')
+    circ = QuantumCircuit(reg_b, reg_c, ancil, name='$HHL$')
+    qpe = quantum_phase_estimation(n, t, controlled_evolutions(A, t0 / (2 ** t), t), vis=vis)
+    circ.append(qpe, range(n + t))
+    circ.ucry(list(inversion_angles(t, t0, C)), list(reg_c), ancil[0])
+    circ.append(qpe.inverse(), range(n + t))
+    if vis:
+        circ.draw('mpl', reverse_bits=True, style={'fontsize': 6, 'subfontsize': 3})\
+            .suptitle('Scalable HHL Circuit', fontsize=16)
+    return circ
+
+
+class HHLSolver:
+
+    def __init__(self, A, t0, r=None, theta=None, size=None, clock=None):
+
+        # Build right hand side independent circuit
+        self.A = np.array(A)
+        self.n = int(np.log2(len(self.A)))
+        if clock is not None:
+            self.circuit = scalable_hhl(A, t0, clock)
+        elif size is None:
+            self.circuit = ad_hoc_hhl(A, t0, r)
+        else:
+            self.circuit = hhl_circuit(A, t0, theta, size)
+        self.num_qubits = self.circuit.num_qubits
+
+        # Precompute operator columns for inputs with auxiliary registers in |0>
+        columns = [Statevector.from_int(i, 2 ** self.num_qubits).evolve(self.circuit).data
+                   for i in range(2 ** self.n)]
+        self.U = np.column_stack(columns)
+
+    def evolve(self, b):
+
+        # Apply circuit to a stack of normalized right hand sides in one matmul
+        b = np.atleast_2d(np.asarray(b, dtype=complex))
+        b = b / np.linalg.norm(b, axis=1, keepdims=True)
+        return (b @ self.U.T).reshape(len(b), 2, -1, 2 ** self.n)
+
+    def solve(self, b):
+
+        # Post-select ancilla = 1 and marginalize clock registers
+        psi = self.evolve(b)
+        dist = np.sum(np.abs(psi[:, 1]) ** 2, axis=1)
+        success = np.sum(dist, axis=1)
+        return dist / success[:, None], success
+
+    def solution(self, b):
+
+        # Read ancilla = 1 amplitudes with clock registers returned to |0>
+        b = np.atleast_2d(np.asarray(b, dtype=complex))
+        psi = self.evolve(b)
+        x = psi[:, 1, 0, :]
+        x = x / np.linalg.norm(x, axis=1, keepdims=True)
+        success = np.sum(np.abs(psi[:, 1]) ** 2, axis=(1, 2))
+
+        # Compare against classical solution up to global phase
+        exact = np.linalg.solve(self.A, b.T).T
+        exact = exact / np.linalg.norm(exact, axis=1, keepdims=True)
+        x = x * np.exp(-1j * np.angle(np.sum(np.conj(exact) * x, axis=1)))[:, None]
+        residual = np.linalg.norm(x - exact, axis=1)
+        return x, success, residual
+
+    def sample(self, b, precision=0.01, confidence=0.95, batch=256, max_shots=2 ** 16, min_selected=100):
+
+        # Build and transpile measured circuit once
+        qasm = Aer.get_backend('qasm_simulator')
+        circ = QuantumCircuit(self.num_qubits, self.n + 1)
+        circ.initialize(np.asarray(b) / np.linalg.norm(b), range(self.n))
+        circ.append(self.circuit, range(self.num_qubits))
+        circ.measure(self.num_qubits - 1, self.n)
+        circ.measure(range(self.n), range(self.n))
+        circ = transpile(circ, qasm)
+
+        # Stream shots until every post-selected probability is within precision
+        estimator = RunningEstimator(2 ** self.n)
+        shots = 0
+        while shots < max_shots:
+            result = qasm.run(assemble(circ, qasm, shots=batch)).result().get_counts()
+            counts = np.zeros(2 ** self.n)
+            for key, val in result.items():
+                if key[0] == '1':
+                    counts[int(key[1:], 2)] += val
+            shots += batch
+
+            # Merge post-selected one-hot outcomes from their counts
+            selected = int(np.sum(counts))
+            if selected > 0:
+                estimator.merge(selected, counts / selected, counts * (1 - counts / selected))
+            if estimator.count >= min_selected and estimator.converged(precision, confidence, method='wilson'):
+                break
+        return estimator.mean, estimator.count / shots, shots
+
+
 if __name__ == '__main__':
     size = [3, 4, 4, 4]
     theta = np.pi/12
@@ -40,3 +40,10 @@ for key in counts.keys():
 plot_histogram([expected_data, measured_data], title='HHL QASM Simulation', legend=['expected', 'measured'])
 plt.subplots_adjust(left=0.15, right=0.72, top=0.9, bottom=0.15)
 plt.show()
+
+# Statevector solution extraction
+solver = cmp.HHLSolver(A, t0, r)
+x_hhl, success, residual = solver.solution(b)
+print('HHL Solution: ', np.round(np.real(x_hhl[0]), 4))
+print('Success Probability: ', success[0])
+print('Residual: ', residual[0])
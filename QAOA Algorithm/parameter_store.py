@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+
+class ParameterStore:
+
+    def __init__(self, path):
+
+        # Load existing entries
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def signature(qaoa):
+
+        # Hash canonical problem structure
+        data = json.dumps(sorted(qaoa.structure()))
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    @staticmethod
+    def interpolate(beta, gamma):
+
+        # Extend depth p parameters to depth p+1 by linear interpolation
+        def interp(x):
+            p = len(x)
+            old = np.concatenate(([0], x, [0]))
+            i = np.arange(1, p + 2)
+            return [float(v) for v in (i - 1) / p * old[i - 1] + (p - i + 1) / p * old[i]]
+
+        return interp(beta), interp(gamma)
+
+    def save(self, qaoa):
+
+        # Keep best known parameters per (signature, p)
+        sig = self.signature(qaoa)
+        key = sig + ':' + str(qaoa.p)
+        value = -float(qaoa.error)
+        if key in self.entries and self.entries[key]['value'] >= value:
+            return
+        self.entries[key] = {'signature': sig, 'n': qaoa.n, 'p': qaoa.p,
+                             'structure': sorted(qaoa.structure()), 'value': value,
+                             'beta': [float(x) for x in qaoa.beta_val],
+                             'gamma': [float(x) for x in qaoa.gamma_val]}
+
+        # Write atomically
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def lookup(self, sig, p):
+
+        # Find exact entry or interpolate from the deepest shallower entry
+        depths = [e['p'] for e in self.entries.values() if e['signature'] == sig and e['p'] <= p]
+        if len(depths) == 0:
+            return None
+        entry = self.entries[sig + ':' + str(max(depths))]
+        beta, gamma = entry['beta'], entry['gamma']
+        for _ in range(max(depths), p):
+            beta, gamma = self.interpolate(beta, gamma)
+        return beta, gamma
+
+    def nearest(self, qaoa):
+
+        # Find instance of the same size with the most similar structure
+        structure = set(map(tuple, qaoa.structure()))
+        best, dist = None, np.inf
+        for e in self.entries.values():
+            if e['n'] != qaoa.n or e['p'] > qaoa.p:
+                continue
+            other = set(map(tuple, e['structure']))
+            d = 1 - len(structure & other) / len(structure | other)
+            if d < dist or (d == dist and e['p'] > best['p']):
+                best, dist = e, d
+        return best
+
+    def initial_point(self, qaoa):
+
+        # Resolve warm start from same instance, then from nearest known instance
+        point = self.lookup(self.signature(qaoa), qaoa.p)
+        if point is None:
+            entry = self.nearest(qaoa)
+            if entry is not None:
+                point = self.lookup(entry['signature'], qaoa.p)
+        return point
@@ -1,16 +1,102 @@
+import copy
 import numpy as np
 import matplotlib.pyplot as plt
 
-from qiskit import QuantumCircuit, Aer, execute
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from qiskit import QuantumCircuit, Aer, execute, transpile, assemble
 from qiskit.circuit import ParameterVector
 from qiskit.extensions import HamiltonianGate
 from qiskit.visualization import plot_histogram
-from qiskit.aqua.components.optimizers import COBYLA
+from qiskit.aqua.components.optimizers import COBYLA, OptimizerSupportLevel
 
 
 class QAOA:
 
-    def __init__(self, clauses, p, num_shots=1024):
+    def __init__(self, clauses, p, num_shots=1024, cost_layer='hamiltonian', exact=False,
+                 optimizer=None, store=None, lazy=False):
+
+        # Assign problem and size parameters
+        self.assign_problem(clauses)
+        self.p = p
+
+        # Assign auxiliary parameters
+        self.num_shots = num_shots
+        self.exact = exact
+        self.optimizer = optimizer
+        self.store = store
+        self.fitted = False
+        self.error = -1
+        self.nfev = 0
+
+        # Create transpilation cache
+        self.transpiled = {}
+        self.cache_info = {'hits': 0, 'misses': 0}
+
+        # Create variational parameters
+        self.gamma = ParameterVector('gamma', length=p)
+        self.beta = ParameterVector('beta', length=p)
+        self.gamma_val = list(np.random.rand(p))
+        self.beta_val = list(np.random.rand(p))
+        if store is not None:
+            point = store.initial_point(self)
+            if point is not None:
+                self.beta_val, self.gamma_val = list(point[0]), list(point[1])
+
+        # Create hamiltonians and variational circuit on first use
+        if cost_layer not in ('hamiltonian', 'phase'):
+            raise ValueError('Unknown cost layer: ' + str(cost_layer))
+        self.cost_layer = cost_layer
+        self._cost_diag = None
+        self._C = None
+        self._terms = None
+        self._varckt = None
+        if not lazy:
+            self.fit()
+
+    @property
+    def cost_diag(self):
+        if self._cost_diag is None:
+            self._cost_diag = self.cost_vector()
+        return self._cost_diag
+
+    @property
+    def C(self):
+        if self._C is None and self.cost_layer == 'hamiltonian':
+            self._C = np.diag(self.cost_diag)
+        return self._C
+
+    @property
+    def terms(self):
+        if self._terms is None and self.cost_layer == 'phase':
+            self._terms = self.cost_terms()
+        return self._terms
+
+    @property
+    def varckt(self):
+        if self._varckt is None:
+            self._varckt = self.build_varckt()
+        return self._varckt
+
+    def fit(self):
+
+        # Optimize once and memoize the result
+        if not self.fitted:
+            self.optimize()
+        return self
+
+    def resolve(self, beta, gamma):
+
+        # Resolve default values, fitting lazily on first use
+        if beta is None or gamma is None:
+            self.fit()
+        if beta is None:
+            beta = self.beta_val
+        if gamma is None:
+            gamma = self.gamma_val
+        return beta, gamma
+
+    def assign_problem(self, clauses):
 
         # Assign weights and clauses
         if isinstance(clauses, dict):
@@ -20,86 +106,261 @@ class QAOA:
             self.clauses = clauses
             self.weights = [1] * len(clauses)
 
-        # Assign size parameters
+        # Assign size parameters and compile clauses
         self.m = len(self.clauses)
         self.n = len(self.clauses[0])
-        self.p = p
+        self.care_mask, self.value_mask, self.weight_vec = self.compile_clauses()
 
-        # Assign auxiliary parameters
-        self.num_shots = num_shots
-        self.error = -1
+    def structure(self):
 
-        # Create variational parameters
-        self.gamma = ParameterVector('gamma', length=p)
-        self.beta = ParameterVector('beta', length=p)
-        self.gamma_val = list(np.random.rand(p))
-        self.beta_val = list(np.random.rand(p))
+        # Canonical (clause, weight) pairs identifying the problem
+        return [[self.clauses[i], float(self.weights[i])] for i in range(self.m)]
+
+    def compile_clauses(self):
+
+        # Encode clauses as care and value bitmasks (bit n-1-j <-> character j)
+        care = [int(''.join('0' if c == 'X' else '1' for c in clause), 2) for clause in self.clauses]
+        value = [int(clause.replace('X', '0'), 2) for clause in self.clauses]
+        return np.array(care, dtype=np.int64), np.array(value, dtype=np.int64), np.array(self.weights)
 
-        # Create hamiltonians and variational circuit
-        self.C = np.diag([self.cost(z) for z in range(2 ** self.n)])
-        self.varckt = self.build_varckt()
-        self.optimize()
+    def cost_vector(self, z=None):
+
+        # Resolve basis states as integers
+        if z is None:
+            z = np.arange(2 ** self.n, dtype=np.int64)
+        else:
+            z = np.array([int(x, 2) if isinstance(x, str) else x for x in z], dtype=np.int64)
+
+        # Evaluate C(z) for all states in bounded chunks
+        cost = np.zeros(len(z), dtype=self.weight_vec.dtype)
+        chunk = max(1, 2 ** 22 // self.m)
+        for i in range(0, len(z), chunk):
+            sat = (z[i:i + chunk, None] & self.care_mask) == self.value_mask
+            cost[i:i + chunk] = sat @ self.weight_vec
+        return cost
 
     def cost(self, z):
 
-        # Convert to bitstr
-        if not isinstance(z, str):
-            z = format(z, '0' + str(self.n) + 'b')
-        z: str
+        # Evaluate C(z) for a single state
+        return self.cost_vector([z])[0]
 
-        # Evaluate C(z)
-        cost = 0
+    def cost_terms(self):
+
+        # Expand each clause projector into weighted Z products
+        terms = {}
         for i in range(self.m):
-            s = True
-            for j in range(self.n):
-                if self.clauses[i][j] != 'X' and self.clauses[i][j] != z[j]:
-                    s = False
-                    break
-            if s:
-                cost += self.weights[i]
-
-        # Return output
-        return cost
+            care = [j for j in range(self.n) if self.clauses[i][j] != 'X']
+            for k in range(2 ** len(care)):
+                qubits = []
+                coeff = self.weights[i] / (2 ** len(care))
+                for r in range(len(care)):
+                    if (k >> r) & 1:
+                        qubits.append(self.n - 1 - care[r])
+                        if self.clauses[i][care[r]] == '1':
+                            coeff = -coeff
+                key = tuple(sorted(qubits))
+                terms[key] = terms.get(key, 0) + coeff
+
+        # Drop global phase and cancelled terms
+        return {key: float(val) for key, val in terms.items() if len(key) > 0 and not np.isclose(val, 0)}
+
+    def build_cost_layer(self, gamma):
+
+        # Build exp(-i*gamma*C) from the dense hamiltonian
+        circ = QuantumCircuit(self.n)
+        if self.cost_layer == 'hamiltonian':
+            circ.append(HamiltonianGate(self.C, gamma), range(self.n))
+            return circ
+
+        # Build exp(-i*gamma*C) from native phase gates
+        for qubits, coeff in self.terms.items():
+            if len(qubits) == 1:
+                circ.rz(2 * coeff * gamma, qubits[0])
+            elif len(qubits) == 2:
+                circ.rzz(2 * coeff * gamma, qubits[0], qubits[1])
+            else:
+                for j in range(len(qubits) - 1):
+                    circ.cx(qubits[j], qubits[j + 1])
+                circ.rz(2 * coeff * gamma, qubits[-1])
+                for j in reversed(range(len(qubits) - 1)):
+                    circ.cx(qubits[j], qubits[j + 1])
+        return circ
 
     def expectation(self, beta=None, gamma=None):
 
         # Resolve default values
-        if beta is None:
-            beta = self.beta_val
-        if gamma is None:
-            gamma = self.gamma_val
+        beta, gamma = self.resolve(beta, gamma)
 
-        # Evaluate expectation value
-        circ = self.varckt.bind_parameters({self.beta: beta, self.gamma: gamma})
-        simulator = Aer.get_backend('qasm_simulator')
-        result = execute(circ, simulator, shots=self.num_shots).result()
+        # Evaluate exact expectation value
+        if self.exact:
+            psi = self.statevector(beta, gamma)
+            return np.dot(np.abs(psi) ** 2, self.cost_diag)
+
+        # Evaluate sampled expectation value
+        result = self.run(beta, gamma, self.num_shots)
         counts = result.get_counts()
-        expval = sum([self.cost(z) * counts[z] / self.num_shots for z in counts.keys()])
+        expval = np.dot(self.cost_vector(counts.keys()), list(counts.values())) / self.num_shots
         return expval
 
-    def optimize(self):
+    def expectation_batch(self, params):
+
+        # Split parameter vectors of shape (k, 2p)
+        params = np.atleast_2d(params)
+        beta = params[:, 0:self.p]
+        gamma = params[:, self.p:2*self.p]
+
+        # Evaluate exact expectation values in one vectorized kernel call
+        if self.exact:
+            psi = self.statevector(beta, gamma)
+            return (np.abs(psi) ** 2) @ self.cost_diag
 
-        # Define objective function
+        # Evaluate sampled expectation values from a single job
+        expvals = []
+        for counts in self.run_batch(beta, gamma, self.num_shots):
+            expvals.append(np.dot(self.cost_vector(counts.keys()), list(counts.values())) / self.num_shots)
+        return np.array(expvals)
+
+    def statevector(self, beta=None, gamma=None):
+
+        # Resolve default values
+        beta, gamma = self.resolve(beta, gamma)
+        beta = np.asarray(beta)
+        gamma = np.asarray(gamma)
+
+        # Evolve uniform superposition through alternating layers (leading axes are batched)
+        psi = np.full(beta.shape[:-1] + (2 ** self.n,), 2 ** (-self.n / 2), dtype=complex)
+        for i in range(self.p):
+            psi = psi * np.exp(-1j * np.multiply.outer(gamma[..., i], self.cost_diag))
+            psi = self.apply_mixer(psi, beta[..., i])
+        return psi
+
+    def apply_mixer(self, psi, beta):
+
+        # Apply RX(2*beta) to every qubit of the statevector
+        shape = psi.shape
+        c = np.reshape(np.cos(beta), np.shape(beta) + (1, 1))
+        s = np.reshape(-1j * np.sin(beta), np.shape(beta) + (1, 1))
+        for q in range(self.n):
+            psi = psi.reshape(shape[:-1] + (-1, 2, 2 ** q))
+            psi = np.stack((c * psi[..., 0, :] + s * psi[..., 1, :],
+                            s * psi[..., 0, :] + c * psi[..., 1, :]), axis=-2)
+        return psi.reshape(shape)
+
+    def apply_driver(self, psi):
+
+        # Apply B = sum_j X_j to the statevector
+        out = np.zeros_like(psi)
+        for q in range(self.n):
+            out += psi.reshape(psi.shape[:-1] + (-1, 2, 2 ** q))[..., ::-1, :].reshape(psi.shape)
+        return out
+
+    def gradient(self, beta=None, gamma=None):
+
+        # Resolve default values
+        beta, gamma = self.resolve(beta, gamma)
+
+        # Adjoint differentiation: sweep back through the layers once
+        psi = self.statevector(beta, gamma)
+        lam = self.cost_diag * psi
+        grad_beta = np.zeros(self.p)
+        grad_gamma = np.zeros(self.p)
+        for i in reversed(range(self.p)):
+            grad_beta[i] = 2 * np.imag(np.vdot(lam, self.apply_driver(psi)))
+            psi = self.apply_mixer(psi, -beta[i])
+            lam = self.apply_mixer(lam, -beta[i])
+            grad_gamma[i] = 2 * np.imag(np.vdot(lam, self.cost_diag * psi))
+            phase = np.exp(1j * gamma[i] * self.cost_diag)
+            psi = psi * phase
+            lam = lam * phase
+
+        # Return d<C>/d(beta, gamma) in optimizer ordering
+        return np.concatenate((grad_beta, grad_gamma))
+
+    def optimize(self, optimizer=None):
+
+        # Resolve optimizer
+        if optimizer is None:
+            optimizer = self.optimizer
+        if optimizer is None:
+            optimizer = COBYLA(maxiter=1000, tol=0.0001)
+
+        # Pass the gradient only to optimizers that use it (is_gradient_supported is also true when ignored)
+        exact = optimizer.gradient_support_level in (OptimizerSupportLevel.supported, OptimizerSupportLevel.required)
+
+        # Define objective and gradient functions (exact objective to match the exact gradient)
         def objfunc(params):
-            return -self.expectation(beta=params[0:self.p], gamma=params[self.p:2*self.p])
+            beta, gamma = params[0:self.p], params[self.p:2*self.p]
+            if exact:
+                return -np.dot(np.abs(self.statevector(beta, gamma)) ** 2, self.cost_diag)
+            return -self.expectation(beta=beta, gamma=gamma)
+
+        def gradfunc(params):
+            return -self.gradient(beta=params[0:self.p], gamma=params[self.p:2*self.p])
+
+        gradient = gradfunc if exact else None
 
         # Optimize parameters
-        optimizer = COBYLA(maxiter=1000, tol=0.0001)
-        params = self.beta_val + self.gamma_val
-        ret = optimizer.optimize(num_vars=2*self.p, objective_function=objfunc, initial_point=params)
+        params = list(self.beta_val) + list(self.gamma_val)
+        ret = optimizer.optimize(num_vars=2*self.p, objective_function=objfunc,
+                                 gradient_function=gradient, initial_point=params)
         self.beta_val = ret[0][0:self.p]
         self.gamma_val = ret[0][self.p:2*self.p]
         self.error = ret[1]
+        self.nfev = ret[2]
+        self.fitted = True
+        if self.store is not None:
+            self.store.save(self)
         return
 
+    def multistart(self, num_starts=8, max_workers=None, rounds=3, keep=0.5, maxiter=1000):
+
+        # Reject optimizers whose per-round iteration budget cannot be enforced
+        if self.optimizer is not None:
+            _limit_iterations(self.optimizer, maxiter // rounds)
+
+        # Draw random initial points
+        stats = []
+        for i in range(num_starts):
+            point = list(np.random.rand(2 * self.p))
+            stats.append({'initial_point': point, 'point': point, 'value': -np.inf,
+                          'nfev': 0, 'rounds': 0, 'cancelled': False})
+
+        # Run starts in rounds, cancelling dominated starts between rounds
+        active = list(range(num_starts))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for r in range(rounds):
+                futures = {pool.submit(_optimize_start, self, stats[i]['point'], maxiter // rounds): i
+                           for i in active}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    point, value, nfev = future.result()
+                    stats[i].update(point=point, value=value, nfev=stats[i]['nfev'] + nfev)
+                    stats[i]['rounds'] += 1
+                if r < rounds - 1:
+                    active.sort(key=lambda j: stats[j]['value'], reverse=True)
+                    for i in active[max(1, int(np.ceil(keep * len(active)))):]:
+                        stats[i]['cancelled'] = True
+                    active = [i for i in active if not stats[i]['cancelled']]
+
+        # Adopt best result
+        best = max(stats, key=lambda entry: entry['value'])
+        self.beta_val = list(best['point'][0:self.p])
+        self.gamma_val = list(best['point'][self.p:2*self.p])
+        self.error = -best['value']
+        self.nfev = sum(entry['nfev'] for entry in stats)
+        self.fitted = True
+        if self.store is not None:
+            self.store.save(self)
+        return best, stats
+
     def build_varckt(self):
 
         # Build variational circuit
         circ = QuantumCircuit(self.n)
         circ.h(range(self.n))
         for i in range(self.p):
-            eC = QuantumCircuit(self.n, name='$U(C,\\gamma_' + str(i + 1) + ')$')
-            eC.append(HamiltonianGate(self.C, self.gamma[i]), range(self.n))
+            eC = self.build_cost_layer(self.gamma[i])
+            eC.name = '$U(C,\\gamma_' + str(i + 1) + ')$'
             eB = QuantumCircuit(self.n, name='$U(B,\\beta_' + str(i + 1) + ')$')
             eB.rx(2*self.beta[i], range(self.n))
             circ.append(eC.to_gate(), range(self.n))
@@ -107,6 +368,56 @@ class QAOA:
         circ.measure_all()
         return circ
 
+    def transpile_varckt(self, backend):
+
+        # Transpile the parametric circuit once per backend
+        key = backend.name()
+        if key in self.transpiled:
+            self.cache_info['hits'] += 1
+        else:
+            self.cache_info['misses'] += 1
+            self.transpiled[key] = transpile(self.varckt, backend)
+        return self.transpiled[key]
+
+    def values(self, circ, beta, gamma):
+
+        # Map parameter values present in the circuit
+        values = dict(zip(self.beta, beta))
+        values.update(zip(self.gamma, gamma))
+        return {k: v for k, v in values.items() if k in circ.parameters}
+
+    def bind(self, circ, beta, gamma):
+
+        # Bind parameter values present in the circuit
+        return circ.bind_parameters(self.values(circ, beta, gamma))
+
+    def run(self, beta, gamma, shots):
+
+        # Dense hamiltonian gates cannot be transpiled while unbound
+        simulator = Aer.get_backend('qasm_simulator')
+        if self.cost_layer == 'hamiltonian':
+            self.cache_info['misses'] += 1
+            circ = self.bind(self.varckt, beta, gamma)
+            return execute(circ, simulator, shots=shots).result()
+
+        # Bind values into the cached transpiled circuit
+        circ = self.bind(self.transpile_varckt(simulator), beta, gamma)
+        return simulator.run(assemble(circ, simulator, shots=shots)).result()
+
+    def run_batch(self, beta, gamma, shots):
+
+        # Bind every parameter set and submit all circuits as one job
+        simulator = Aer.get_backend('qasm_simulator')
+        if self.cost_layer == 'hamiltonian':
+            self.cache_info['misses'] += 1
+            circs = [self.bind(self.varckt, beta[i], gamma[i]) for i in range(len(beta))]
+            result = execute(circs, simulator, shots=shots).result()
+        else:
+            circ = self.transpile_varckt(simulator)
+            binds = [self.values(circ, beta[i], gamma[i]) for i in range(len(beta))]
+            result = simulator.run(assemble(circ, simulator, shots=shots, parameter_binds=binds)).result()
+        return [result.get_counts(i) for i in range(len(beta))]
+
     def sample(self, shots=None, vis=False):
 
         # Resolve defaults
@@ -114,9 +425,8 @@ class QAOA:
             shots = self.num_shots
 
         # Sample maximum cost value
-        circ = self.varckt.bind_parameters({self.beta: self.beta_val, self.gamma: self.gamma_val})
-        simulator = Aer.get_backend('qasm_simulator')
-        result = execute(circ, simulator, shots=shots).result()
+        self.fit()
+        result = self.run(self.beta_val, self.gamma_val, shots)
         counts = result.get_counts()
         if vis:
             plot_histogram(counts, title='Sample Output', bar_labels=False)
@@ -124,6 +434,104 @@ class QAOA:
         return max(counts, key=counts.get)
 
 
+class MaxCut(QAOA):
+
+    def __init__(self, graph, p, cost_layer='phase', **kwargs):
+        super().__init__(graph, p, cost_layer=cost_layer, **kwargs)
+
+    def assign_problem(self, graph):
+
+        # Extract weighted edge list from networkx graph or edge array
+        if hasattr(graph, 'edges'):
+            index = {v: i for i, v in enumerate(graph.nodes)}
+            edges = [(index[u], index[v], d.get('weight', 1)) for u, v, d in graph.edges(data=True)]
+            self.n = len(index)
+        else:
+            edges = [tuple(e) if len(e) == 3 else (e[0], e[1], 1) for e in graph]
+            self.n = int(max(max(e[0], e[1]) for e in edges)) + 1
+
+        # Assign edge arrays (node i <-> bit n-1-i, as in the clause strings)
+        edges = [e for e in edges if e[0] != e[1]]
+        self.edges = np.array([[e[0], e[1]] for e in edges], dtype=np.int64).reshape(-1, 2)
+        self.weight_vec = np.array([e[2] for e in edges])
+        self.clauses = None
+        self.weights = list(self.weight_vec)
+        self.m = len(edges)
+
+    def structure(self):
+
+        # Canonical (u, v, weight) triples identifying the graph
+        return [[int(min(u, v)), int(max(u, v)), float(w)] for (u, v), w in zip(self.edges, self.weight_vec)]
+
+    def cost_vector(self, z=None):
+
+        # Resolve basis states as integers
+        if z is None:
+            z = np.arange(2 ** self.n, dtype=np.int64)
+        else:
+            z = np.array([int(x, 2) if isinstance(x, str) else x for x in z], dtype=np.int64)
+
+        # Evaluate cut values for all states in bounded chunks
+        shift = self.n - 1 - self.edges
+        cost = np.zeros(len(z), dtype=self.weight_vec.dtype)
+        chunk = max(1, 2 ** 22 // max(1, self.m))
+        for i in range(0, len(z), chunk):
+            block = z[i:i + chunk, None]
+            cut = ((block >> shift[:, 0]) ^ (block >> shift[:, 1])) & 1
+            cost[i:i + chunk] = cut @ self.weight_vec
+        return cost
+
+    def cost_terms(self):
+
+        # Each edge contributes w/2 * (1 - Z_u Z_v)
+        terms = {}
+        for (u, v), w in zip(self.edges, self.weight_vec):
+            key = tuple(sorted((self.n - 1 - int(u), self.n - 1 - int(v))))
+            terms[key] = terms.get(key, 0) - w / 2
+        return {key: float(val) for key, val in terms.items() if not np.isclose(val, 0)}
+
+
+def _limit_iterations(optimizer, maxiter):
+
+    # Copy the optimizer with its iteration cap replaced, wherever that optimizer reads it from
+    optimizer = copy.deepcopy(optimizer)
+    limited = False
+    if isinstance(getattr(optimizer, '_maxiter', None), list):
+        if len(optimizer._maxiter) != 1:
+            raise ValueError('Cannot limit iterations of a multi-epoch ' + type(optimizer).__name__)
+        optimizer._maxiter = [maxiter]
+        limited = True
+    elif hasattr(optimizer, '_maxiter'):
+        optimizer._maxiter = maxiter
+        limited = True
+    options = getattr(optimizer, '_options', {})
+    if 'maxiter' in options:
+        optimizer.set_options(maxiter=maxiter)
+        limited = True
+    elif 'maxfun' in options:
+        optimizer.set_options(maxfun=maxiter)
+        limited = True
+    if not limited:
+        raise ValueError('Cannot limit iterations of optimizer ' + type(optimizer).__name__)
+    return optimizer
+
+
+def _optimize_start(qaoa, point, maxiter):
+
+    # Resolve optimizer with the per-round iteration budget
+    if qaoa.optimizer is None:
+        optimizer = COBYLA(maxiter=maxiter, tol=0.0001)
+    else:
+        optimizer = _limit_iterations(qaoa.optimizer, maxiter)
+
+    # Run a single trajectory in the worker process
+    qaoa.store = None
+    qaoa.beta_val = list(point[0:qaoa.p])
+    qaoa.gamma_val = list(point[qaoa.p:2*qaoa.p])
+    qaoa.optimize(optimizer)
+    return list(qaoa.beta_val) + list(qaoa.gamma_val), float(-qaoa.error), qaoa.nfev
+
+
 if __name__ == '__main__':
     qaoa = QAOA(['10XX0', '11XXX'], 3)
     print('Maximized Expectation Value: ' + str(qaoa.expectation()))
@@ -2,7 +2,7 @@ import networkx as nx
 import matplotlib.pyplot as plt
 
 from networkx.drawing.layout import spring_layout
-from qaoa_components import QAOA
+from qaoa_components import MaxCut
 
 
 # Build input graph
@@ -22,21 +22,8 @@ pos = spring_layout(G)
 nx.draw(G, with_labels=True, node_color='lightgreen', edge_color='lightblue',
         style='solid', width=2, ax=ax, pos=pos, font_size=8, font_weight='bold')
 
-# Generate QAOA clauses
-clauses = []
-for i in range(len(E)):
-    edge = E[i]
-    clause = ['X'] * len(V)
-    clause[edge[0]] = '0'
-    clause[edge[1]] = '1'
-    clauses.append("".join(clause))
-    clause = ['X'] * len(V)
-    clause[edge[0]] = '1'
-    clause[edge[1]] = '0'
-    clauses.append("".join(clause))
-
 # Execute QAOA
-qaoa = QAOA(clauses, 6)
+qaoa = MaxCut(G, 6)
 z = qaoa.sample(vis=True)
 print('Sampled Output: ' + str(z))
 print('Optimized Cost: ' + str(qaoa.cost(z)))
@@ -0,0 +1,11 @@
+"""Import Shim for the Streaming Estimator
+
+The estimator is maintained in Schumacher Compression/estimator.py. This file runs that source in its own
+namespace, so 'from estimator import RunningEstimator' works from this folder without a second copy.
+"""
+
+import os
+
+_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Schumacher Compression', 'estimator.py')
+with open(_path) as _f:
+    exec(compile(_f.read(), _path, 'exec'))
@@ -0,0 +1,72 @@
+import numpy as np
+
+from itertools import product
+from qiskit import QuantumCircuit
+from qiskit.quantum_info import Operator, Statevector
+
+
+# Single qubit Pauli channels as (letters, probabilities for a vector of p)
+CHANNELS = {
+    'bit_flip': ('IX', lambda p: [1 - p, p]),
+    'phase_flip': ('IZ', lambda p: [1 - p, p]),
+    'depolarizing': ('IXYZ', lambda p: [1 - 3 * p / 4, p / 4, p / 4, p / 4]),
+}
+
+
+class FidelitySweep:
+
+    def __init__(self, qecc, prep=None):
+
+        # Initialize sizes
+        self.k = len(qecc.code)
+        self.r = len(qecc.syndrm)
+        self.num_qubits = self.k + self.r
+
+        # Precompile encoded input state
+        if prep is None:
+            prep = QuantumCircuit(qecc.code, qecc.syndrm)
+        self.encoded = Statevector.from_label('0' * self.num_qubits).evolve(prep + qecc.encoder_ckt).data
+        self.encoded_code = self.encoded.reshape(2 ** self.r, 2 ** self.k)[0]
+
+        # Precompile syndrome extraction and correction into a single recovery operator
+        self.recovery = Operator(qecc.syndrome_ckt + qecc.build_correction('coherent')).data
+        self.contributions = {}
+
+    def apply_pauli(self, psi, pattern):
+
+        # Apply a Pauli string (character i acts on code qubit i) to the statevector
+        psi = psi.reshape([2] * self.num_qubits).copy()
+        for q, letter in enumerate(pattern):
+            axis = self.num_qubits - 1 - q
+            if letter in 'XY':
+                psi = np.flip(psi, axis=axis)
+            if letter in 'ZY':
+                index = [slice(None)] * self.num_qubits
+                index[axis] = 1
+                psi[tuple(index)] *= -1
+            if letter == 'Y':
+                psi = psi * 1j
+        return psi.reshape(-1)
+
+    def contribution(self, kind):
+
+        # Evaluate fidelity of every Pauli error pattern once per channel kind
+        if kind not in self.contributions:
+            letters = CHANNELS[kind][0]
+            patterns = list(product(range(len(letters)), repeat=self.k))
+            states = np.array([self.apply_pauli(self.encoded, [letters[i] for i in e]) for e in patterns])
+
+            # Batched overlaps without and with recovery
+            f1 = np.abs(states @ self.encoded.conj()) ** 2
+            corrected = (states @ self.recovery.T).reshape(len(patterns), 2 ** self.r, 2 ** self.k)
+            f2 = np.sum(np.abs(corrected @ self.encoded_code.conj()) ** 2, axis=1)
+            self.contributions[kind] = (np.array(patterns), f1, f2)
+        return self.contributions[kind]
+
+    def sweep(self, p_error, kind='bit_flip'):
+
+        # Weight pattern fidelities by their probabilities for all p at once
+        patterns, f1, f2 = self.contribution(kind)
+        probs = np.array(CHANNELS[kind][1](np.atleast_1d(np.asarray(p_error, dtype=float)))).T
+        weights = np.prod(probs[:, patterns], axis=2)
+        return weights @ f1, weights @ f2
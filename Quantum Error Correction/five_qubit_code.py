@@ -2,17 +2,27 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from qiskit import QuantumCircuit
-from qiskit import QuantumRegister
+from qiskit import QuantumRegister, ClassicalRegister
 from qiskit.quantum_info import Operator
 from qiskit.circuit.library.standard_gates import XGate, YGate, ZGate
 
 
 class FiveQubitCode:
 
-    def __init__(self):
+    # Syndrome Lookup Table: syndrome -> (pauli, code qubit)
+    SYNDROME_TABLE = {0b0010: ('x', 0), 0b1110: ('y', 0), 0b1100: ('z', 0),
+                      0b0101: ('x', 1), 0b1101: ('y', 1), 0b1000: ('z', 1),
+                      0b1010: ('x', 2), 0b1011: ('y', 2), 0b0001: ('z', 2),
+                      0b0100: ('x', 3), 0b0111: ('y', 3), 0b0011: ('z', 3),
+                      0b1001: ('x', 4), 0b1111: ('y', 4), 0b0110: ('z', 4)}
+
+    def __init__(self, correction='coherent'):
         # Initialize Registers
         self.code = QuantumRegister(5, name="code")
         self.syndrm = QuantumRegister(4, name="syndrome")
+        self.syndrm_bits = ClassicalRegister(4, name="syndrome_bits")
+        self.data = self.code[4]
+        self.correction = correction
 
         # Build Circuit Components
         self.encoder_ckt = self.build_encoder()
@@ -79,24 +89,23 @@ class FiveQubitCode:
         circ.h(self.syndrm)
         return circ
 
-    def build_correction(self):
-        # Build Correction Circuit
+    def build_correction(self, mode=None):
+        # Build Lookup Table Correction Circuit
+        if mode is None:
+            mode = self.correction
+        if mode == 'lookup':
+            circ = QuantumCircuit(self.code, self.syndrm, self.syndrm_bits)
+            circ.measure(self.syndrm, self.syndrm_bits)
+            for syndrome, (pauli, qubit) in self.SYNDROME_TABLE.items():
+                getattr(circ, pauli)(self.code[qubit]).c_if(self.syndrm_bits, syndrome)
+            return circ
+
+        # Build Coherent Correction Circuit
+        gates = {'x': XGate, 'y': YGate, 'z': ZGate}
         circ = QuantumCircuit(self.code, self.syndrm)
-        circ.append(XGate().control(4, ctrl_state='0010'), [self.syndrm[i] for i in range(4)] + [self.code[0]])
-        circ.append(YGate().control(4, ctrl_state='1110'), [self.syndrm[i] for i in range(4)] + [self.code[0]])
-        circ.append(ZGate().control(4, ctrl_state='1100'), [self.syndrm[i] for i in range(4)] + [self.code[0]])
-        circ.append(XGate().control(4, ctrl_state='0101'), [self.syndrm[i] for i in range(4)] + [self.code[1]])
-        circ.append(YGate().control(4, ctrl_state='1101'), [self.syndrm[i] for i in range(4)] + [self.code[1]])
-        circ.append(ZGate().control(4, ctrl_state='1000'), [self.syndrm[i] for i in range(4)] + [self.code[1]])
-        circ.append(XGate().control(4, ctrl_state='1010'), [self.syndrm[i] for i in range(4)] + [self.code[2]])
-        circ.append(YGate().control(4, ctrl_state='1011'), [self.syndrm[i] for i in range(4)] + [self.code[2]])
-        circ.append(ZGate().control(4, ctrl_state='0001'), [self.syndrm[i] for i in range(4)] + [self.code[2]])
-        circ.append(XGate().control(4, ctrl_state='0100'), [self.syndrm[i] for i in range(4)] + [self.code[3]])
-        circ.append(YGate().control(4, ctrl_state='0111'), [self.syndrm[i] for i in range(4)] + [self.code[3]])
-        circ.append(ZGate().control(4, ctrl_state='0011'), [self.syndrm[i] for i in range(4)] + [self.code[3]])
-        circ.append(XGate().control(4, ctrl_state='1001'), [self.syndrm[i] for i in range(4)] + [self.code[4]])
-        circ.append(YGate().control(4, ctrl_state='1111'), [self.syndrm[i] for i in range(4)] + [self.code[4]])
-        circ.append(ZGate().control(4, ctrl_state='0110'), [self.syndrm[i] for i in range(4)] + [self.code[4]])
+        for syndrome, (pauli, qubit) in self.SYNDROME_TABLE.items():
+            circ.append(gates[pauli]().control(4, ctrl_state=syndrome),
+                        [self.syndrm[i] for i in range(4)] + [self.code[qubit]])
         return circ
 
     def visualize(self):
@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 
 from qiskit import QuantumCircuit, ClassicalRegister
 from qiskit import Aer, execute
+from qiskit.result import marginal_counts
 from qiskit.visualization import plot_histogram, plot_bloch_vector
 from five_qubit_code import FiveQubitCode
 
@@ -17,7 +18,7 @@ phi = np.pi / 4
 # Initialize error correcting circuit, backend and noise model
 qasm = Aer.get_backend('qasm_simulator')
 noise_depol = noise.depolarizing_noise(error_prob)
-qecc = FiveQubitCode()
+qecc = FiveQubitCode(correction='lookup')
 
 # Visualize parameters
 print(noise_depol)
@@ -43,7 +44,7 @@ counts_noisy = job.result().get_counts()
 # QASM simulation with error correction
 job = execute(circ + qecc.circuit + meas, backend=qasm, noise_model=noise_depol,
               basis_gates=noise_depol.basis_gates)
-counts_corrected = job.result().get_counts()
+counts_corrected = marginal_counts(job.result().get_counts(), range(5))
 
 # Plot QASM simulation data
 plot_histogram([counts_noisy, counts_corrected],
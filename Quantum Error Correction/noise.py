@@ -1,19 +1,76 @@
+from functools import lru_cache
 from qiskit.providers.aer.noise import NoiseModel
 from qiskit.providers.aer.noise import pauli_error
 from qiskit.providers.aer.noise import depolarizing_error
+from qiskit.providers.aer.noise import amplitude_damping_error
 
+NOISE_CACHE_SIZE = 128
+TWO_QUBIT_GATES = ('cx', 'cz', 'cy', 'swap')
 
-def bit_flip_noise(p):
+
+def channel(kind, p, num_qubits=1):
+    if kind == 'bit_flip':
+        error = pauli_error([('X', p), ('I', 1 - p)])
+    elif kind == 'phase_flip':
+        error = pauli_error([('Z', p), ('I', 1 - p)])
+    elif kind == 'depolarizing':
+        error = depolarizing_error(p, num_qubits=1)
+    elif kind == 'amplitude_damping':
+        error = amplitude_damping_error(p)
+    else:
+        raise ValueError('Unknown noise channel: ' + str(kind))
+
+    # Independent copies on each qubit of a multi-qubit gate
+    result = error
+    for _ in range(num_qubits - 1):
+        result = result.tensor(error)
+    return result
+
+
+def combined_channel(kinds, p, num_qubits=1):
+    # Apply the channels one after another
+    error = channel(kinds[0], p, num_qubits)
+    for kind in kinds[1:]:
+        error = error.compose(channel(kind, p, num_qubits))
+    return error
+
+
+def noise_model(kind, p, qubits=None, gates=None):
+    # Normalize arguments into hashable cache keys ('bit_flip+phase_flip' combines channels)
+    kinds = tuple(kind.split('+')) if isinstance(kind, str) else tuple(kind)
+    qubits = None if qubits is None else tuple(qubits)
+    gates = () if gates is None else tuple(gates)
+    return _noise_model(kinds, float(p), qubits, gates)
+
+
+@lru_cache(maxsize=NOISE_CACHE_SIZE)
+def _noise_model(kinds, p, qubits, gates):
+    # Models are shared between callers and must not be modified
     noise_model = NoiseModel()
-    error = pauli_error([('X', p), ('I', 1 - p)])
-    noise_model.add_all_qubit_quantum_error(error, 'noise')
+
+    # Noise channel on the 'noise' label, on all or selected qubits
+    error = combined_channel(kinds, p)
+    if qubits is None:
+        noise_model.add_all_qubit_quantum_error(error, 'noise')
+    else:
+        for q in qubits:
+            noise_model.add_quantum_error(error, 'noise', [q])
+
+    # Gate level noise following each listed gate
+    for gate in gates:
+        size = 2 if gate in TWO_QUBIT_GATES else 1
+        noise_model.add_all_qubit_quantum_error(combined_channel(kinds, p, size), gate)
     noise_model.add_basis_gates(['unitary'])
     return noise_model
 
 
+def clear_noise_cache():
+    _noise_model.cache_clear()
+
+
+def bit_flip_noise(p):
+    return noise_model('bit_flip', p)
+
+
 def depolarizing_noise(p):
-    noise_model = NoiseModel()
-    error = depolarizing_error(p, num_qubits=1)
-    noise_model.add_all_qubit_quantum_error(error, 'noise')
-    noise_model.add_basis_gates(['unitary'])
-    return noise_model
+    return noise_model('depolarizing', p)
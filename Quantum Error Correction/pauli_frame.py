@@ -0,0 +1,161 @@
+import numpy as np
+
+from estimator import RunningEstimator
+
+
+# Pauli frame update rules for Clifford gates (signs are irrelevant for frames)
+CLIFFORD_GATES = ('id', 'x', 'y', 'z', 'h', 's', 'sdg', 'cx', 'cz', 'swap', 'barrier')
+
+# Single qubit channels as probabilities of (X, Y, Z) for error probability p
+CHANNELS = {
+    'bit_flip': lambda p: (p, 0, 0),
+    'phase_flip': lambda p: (0, 0, p),
+    'depolarizing': lambda p: (p / 4, p / 4, p / 4),
+}
+
+
+class PauliFrameSimulator:
+
+    def __init__(self, qecc, data=None):
+
+        # Index code and syndrome qubits
+        self.k = len(qecc.code)
+        self.r = len(qecc.syndrm)
+        self.num_qubits = self.k + self.r
+        self.index = {bit: i for i, bit in enumerate(list(qecc.code) + list(qecc.syndrm))}
+        if data is None:
+            data = qecc.data
+        data = self.index[data]
+
+        # Compile Clifford circuits into frame operations
+        self.encoder = self.compile(qecc.encoder_ckt)
+        self.syndrome = self.compile(qecc.syndrome_ckt)
+
+        # Propagate logical operators through the encoder
+        self.logical_x = self.propagate_single(self.encoder, data, 'X')
+        self.logical_z = self.propagate_single(self.encoder, data, 'Z')
+
+        # Build syndrome lookup table from single qubit errors
+        self.table = self.build_table()
+
+    def compile(self, circ):
+
+        # Translate circuit into (gate, qubits) frame operations
+        ops = []
+        for instr, qargs, _ in circ.data:
+            if instr.name not in CLIFFORD_GATES:
+                raise ValueError('Gate is not supported by the Pauli frame simulator: ' + instr.name)
+            if instr.name in ('h', 's', 'sdg', 'cx', 'cz', 'swap'):
+                ops.append((instr.name, [self.index[q] for q in qargs]))
+        return ops
+
+    @staticmethod
+    def apply(ops, x, z):
+
+        # Conjugate frames (rows are qubits, columns are packed trials) through the gates
+        for name, q in ops:
+            if name == 'h':
+                x[q[0]], z[q[0]] = z[q[0]].copy(), x[q[0]].copy()
+            elif name in ('s', 'sdg'):
+                z[q[0]] ^= x[q[0]]
+            elif name == 'cx':
+                x[q[1]] ^= x[q[0]]
+                z[q[0]] ^= z[q[1]]
+            elif name == 'cz':
+                z[q[0]] ^= x[q[1]]
+                z[q[1]] ^= x[q[0]]
+            elif name == 'swap':
+                x[[q[0], q[1]]] = x[[q[1], q[0]]]
+                z[[q[0], q[1]]] = z[[q[1], q[0]]]
+        return x, z
+
+    def single(self, qubit, pauli):
+
+        # Frame holding a single qubit Pauli operator
+        x = np.zeros((self.num_qubits, 1), dtype=np.uint8)
+        z = np.zeros((self.num_qubits, 1), dtype=np.uint8)
+        x[qubit] = pauli in 'XY'
+        z[qubit] = pauli in 'ZY'
+        return x, z
+
+    def propagate_single(self, ops, qubit, pauli):
+
+        # Propagate a single qubit Pauli operator through the gates
+        x, z = self.apply(ops, *self.single(qubit, pauli))
+        return x[:self.k, 0], z[:self.k, 0]
+
+    def build_table(self):
+
+        # Map each syndrome to the first single qubit error producing it
+        table = {0: (np.zeros(self.k, dtype=np.uint8), np.zeros(self.k, dtype=np.uint8))}
+        for pauli in 'XZY':
+            for q in range(self.k):
+                x, z = self.single(q, pauli)
+                correction = (x[:self.k, 0].copy(), z[:self.k, 0].copy())
+                x, z = self.apply(self.syndrome, x, z)
+                syndrome = sum(int(x[self.k + j, 0]) << j for j in range(self.r))
+                if syndrome not in table:
+                    table[syndrome] = correction
+        return table
+
+    @staticmethod
+    def anticommutes(x, z, op):
+
+        # Parity of the symplectic product between packed frames and a Pauli operator
+        ox, oz = op
+        return np.bitwise_xor.reduce(np.vstack((x[oz.astype(bool)], z[ox.astype(bool)])), axis=0)
+
+    def sample_errors(self, p, trials, kind, rng):
+
+        # Draw independent single qubit Pauli errors on the code register and pack trials into bits
+        px, py, pz = CHANNELS[kind](p)
+        u = rng.random((self.k, trials))
+        ex = u < px + py
+        ez = (u >= px) & (u < px + py + pz)
+        x = np.zeros((self.num_qubits, (trials + 7) // 8), dtype=np.uint8)
+        z = np.zeros((self.num_qubits, (trials + 7) // 8), dtype=np.uint8)
+        x[:self.k] = np.packbits(ex, axis=1)
+        z[:self.k] = np.packbits(ez, axis=1)
+        return x, z
+
+    def run(self, p, trials=10 ** 6, kind='depolarizing', batch=2 ** 20, seed=None, precision=None,
+            confidence=0.95):
+
+        # Accumulate logical failures over batches of packed trials, stopping early once precise enough
+        rng = np.random.default_rng(seed)
+        estimator = RunningEstimator(3)
+        while estimator.count < trials:
+            size = min(batch, trials - estimator.count)
+            fail_x, fail_z = self.run_batch(p, size, kind, rng)
+            failures = np.array([np.unpackbits(f)[:size].sum() for f in (fail_x, fail_z, fail_x | fail_z)])
+            estimator.merge(size, failures / size, failures * (1 - failures / size))
+            if precision is not None and estimator.converged(precision, confidence, method='wilson'):
+                break
+
+        # Return logical error rates
+        rates = dict(zip(('logical_x', 'logical_z', 'logical'), estimator.mean.tolist()))
+        rates['trials'] = estimator.count
+        return rates
+
+    def run_batch(self, p, trials, kind, rng):
+
+        # Propagate sampled errors through syndrome extraction
+        x, z = self.sample_errors(p, trials, kind, rng)
+        code_x, code_z = x[:self.k].copy(), z[:self.k].copy()
+        x, z = self.apply(self.syndrome, x, z)
+        syndrome = x[self.k:]
+
+        # Apply lookup table corrections with bitwise masks
+        for value, (cx, cz) in self.table.items():
+            if value == 0:
+                continue
+            mask = np.full(syndrome.shape[1], 0xFF, dtype=np.uint8)
+            for j in range(self.r):
+                mask &= syndrome[j] if (value >> j) & 1 else ~syndrome[j]
+            code_x[cx.astype(bool)] ^= mask
+            code_z[cz.astype(bool)] ^= mask
+
+        # Residual anticommuting with logical Z flips the logical bit, with logical X its phase
+        fail_x = self.anticommutes(code_x, code_z, self.logical_z)
+        fail_z = self.anticommutes(code_x, code_z, self.logical_x)
+        return fail_x, fail_z
@@ -2,23 +2,30 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from qiskit import QuantumCircuit
-from qiskit import QuantumRegister
+from qiskit import QuantumRegister, ClassicalRegister
 from qiskit.quantum_info import Operator
 from qiskit.circuit.library.standard_gates import XGate
 
 
 class ThreeQubitCode:
 
-    def __init__(self):
+    # Syndrome Lookup Table: syndrome -> (pauli, code qubit)
+    SYNDROME_TABLE = {2: ('x', 2), 3: ('x', 1), 1: ('x', 0)}
+
+    def __init__(self, correction='coherent'):
 
         # Initialize Registers
         self.code = QuantumRegister(3, name="code")
         self.syndrm = QuantumRegister(2, name="syndrome")
+        self.syndrm_bits = ClassicalRegister(2, name="syndrome_bits")
+        self.data = self.code[0]
+        self.correction = correction
 
         # Build Circuit Components
         self.encoder_ckt = self.build_encoder()
         self.syndrome_ckt = self.build_syndrome()
         self.correction_ckt = self.build_correction()
+        self.decoder_ckt = self.encoder_ckt.mirror()
 
         # Build Noisy Channel
         self.noise_ckt = QuantumCircuit(self.code, self.syndrm)
@@ -53,13 +60,22 @@ class ThreeQubitCode:
         circ.h(self.syndrm)
         return circ
 
-    def build_correction(self):
+    def build_correction(self, mode=None):
+
+        # Build Lookup Table Correction Circuit
+        if mode is None:
+            mode = self.correction
+        if mode == 'lookup':
+            circ = QuantumCircuit(self.code, self.syndrm, self.syndrm_bits)
+            circ.measure(self.syndrm, self.syndrm_bits)
+            for syndrome, (pauli, qubit) in self.SYNDROME_TABLE.items():
+                getattr(circ, pauli)(self.code[qubit]).c_if(self.syndrm_bits, syndrome)
+            return circ
 
-        # Build Correction Circuit
+        # Build Coherent Correction Circuit
         circ = QuantumCircuit(self.code, self.syndrm)
-        circ.append(XGate().control(2, ctrl_state=2), [self.syndrm[0], self.syndrm[1], self.code[2]])
-        circ.append(XGate().control(2, ctrl_state=3), [self.syndrm[0], self.syndrm[1], self.code[1]])
-        circ.append(XGate().control(2, ctrl_state=1), [self.syndrm[0], self.syndrm[1], self.code[0]])
+        for syndrome, (pauli, qubit) in self.SYNDROME_TABLE.items():
+            circ.append(XGate().control(2, ctrl_state=syndrome), [self.syndrm[0], self.syndrm[1], self.code[qubit]])
         return circ
 
     def visualize(self):
@@ -6,10 +6,9 @@ import matplotlib.pyplot as plt
 
 from qiskit import QuantumCircuit, ClassicalRegister
 from qiskit import Aer, execute
-from qiskit.quantum_info import partial_trace, state_fidelity
-from qiskit.quantum_info import DensityMatrix, Kraus
 from qiskit.visualization import plot_histogram, plot_bloch_vector
 from three_qubit_code import ThreeQubitCode
+from fidelity_sweep import FidelitySweep
 
 # Parameters
 error_prob = 0.05
@@ -18,8 +17,6 @@ phi = np.pi/4
 
 # Initialize error correcting circuit, backend and noise model
 qasm = Aer.get_backend('qasm_simulator')
-svsm = Aer.get_backend('statevector_simulator')
-unit = Aer.get_backend('unitary_simulator')
 noise_model = noise.bit_flip_noise(error_prob)
 qecc = ThreeQubitCode()
 
@@ -56,41 +53,15 @@ plot_histogram([counts_noisy, counts_corrected],
 plt.subplots_adjust(left=0.15, right=0.72, top=0.9, bottom=0.15)
 plt.show()
 
-# Initialize fidelity simulation objects
-job = execute(circ + qecc.encoder_ckt, backend=svsm)
-init_state = DensityMatrix(job.result().get_statevector())
-job = execute(qecc.syndrome_ckt, backend=unit)
-syndrome_op = Kraus(job.result().get_unitary())
+# Initialize fidelity sweep engine
+prep = QuantumCircuit(qecc.code, qecc.syndrm)
+prep.ry(theta, qecc.code[0])
+prep.rz(phi, qecc.code[0])
+sweep = FidelitySweep(qecc, prep)
 
-# Initialize fidelity simulation parameters
-p_error = [0.05 * i for i in range(11)]
-f1 = []
-f2 = []
-
-# Evolve initial state
-for p in p_error:
-
-    # Build noise channel
-    bit_flip_channel = Kraus([[[0, np.sqrt(p)],
-                               [np.sqrt(p), 0]],
-                              [[np.sqrt(1-p), 0],
-                               [0, np.sqrt(1-p)]]])
-    bit_flip_channel = bit_flip_channel.tensor(bit_flip_channel).tensor(bit_flip_channel)
-    bit_flip_channel = bit_flip_channel.expand(Kraus(np.eye(2))).expand(Kraus(np.eye(2)))
-
-    # Apply channels
-    corrupted_state = DensityMatrix(init_state.evolve(bit_flip_channel))
-    corrected_state = DensityMatrix(corrupted_state.evolve(syndrome_op))
-    corrected_state = DensityMatrix(corrected_state.evolve(qecc.correction_ckt))
-
-    # Trace out syndrome
-    ini = DensityMatrix(partial_trace(init_state, [3, 4]))
-    corrupted_state = DensityMatrix(partial_trace(corrupted_state, [3, 4]))
-    corrected_state = DensityMatrix(partial_trace(corrected_state, [3, 4]))
-
-    # Record results
-    f1.append(state_fidelity(ini, corrupted_state))
-    f2.append(state_fidelity(ini, corrected_state))
+# Evaluate fidelity for all error probabilities at once
+p_error = np.linspace(0, 0.5, 101)
+f1, f2 = sweep.sweep(p_error, kind='bit_flip')
 
 # Plot fidelity
 fig = plt.figure(figsize=(8, 6))
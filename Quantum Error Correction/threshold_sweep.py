@@ -0,0 +1,130 @@
+"""Headless Logical Error Rate Sweeps for the 3 and 5 Qubit Codes"""
+
+import os
+import csv
+import argparse
+import matplotlib
+matplotlib.use('Agg')
+
+import noise
+import numpy as np
+
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from qiskit import QuantumCircuit, ClassicalRegister
+from qiskit import Aer, transpile, assemble
+from qiskit.result import marginal_counts
+from three_qubit_code import ThreeQubitCode
+from five_qubit_code import FiveQubitCode
+
+# Available codes, noise channels and output columns
+CODES = {'three': ThreeQubitCode, 'five': FiveQubitCode}
+NOISE_MODELS = ('bit_flip', 'phase_flip', 'depolarizing', 'amplitude_damping')
+FIELDS = ['code', 'model', 'gates', 'p', 'basis', 'shots', 'error_uncoded', 'error_coded']
+
+
+@lru_cache(maxsize=None)
+def build_circuits(code, correction, basis_gates):
+
+    # Build uncoded and coded circuits for logical |0> and |+> inputs
+    qecc = CODES[code](correction=correction)
+    circuits = []
+    for basis in 'ZX':
+        output = ClassicalRegister(1, name='output')
+        prep = QuantumCircuit(qecc.code, qecc.syndrm, output)
+        meas = QuantumCircuit(qecc.code, qecc.syndrm, output)
+        if basis == 'X':
+            prep.h(qecc.data)
+            meas.h(qecc.data)
+        meas.measure(qecc.data, output[0])
+        circuits.append(prep + qecc.noise_ckt + meas)
+        circuits.append(prep + qecc.encoder_ckt + qecc.noise_ckt + qecc.syndrome_ckt +
+                        qecc.correction_ckt + qecc.decoder_ckt + meas)
+
+    # Transpile once per worker and reuse for every error probability (no optimization to keep noisy gates)
+    return transpile(circuits, backend=Aer.get_backend('qasm_simulator'), basis_gates=list(basis_gates),
+                     optimization_level=0)
+
+
+def simulate_point(code, model, p, shots=1024, correction='lookup', gates=()):
+
+    # Fetch cached noise model and circuits
+    noise_model = noise.noise_model(model, p, gates=gates)
+    circuits = build_circuits(code, correction, tuple(noise_model.basis_gates))
+
+    # Simulate all circuits in one job
+    qasm = Aer.get_backend('qasm_simulator')
+    result = qasm.run(assemble(circuits, shots=shots), noise_model=noise_model).result()
+    errors = [marginal_counts(result.get_counts(i), [0]).get('1', 0) / shots for i in range(len(circuits))]
+
+    # Return one row per basis
+    return [{'code': code, 'model': model, 'gates': ' '.join(gates), 'p': p, 'basis': basis, 'shots': shots,
+             'error_uncoded': errors[2 * i], 'error_coded': errors[2 * i + 1]} for i, basis in enumerate('ZX')]
+
+
+def completed_points(path):
+
+    # Collect (code, model, gates, p) points with rows for both bases, skipping malformed rows
+    bases = {}
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    key = (row['code'], row['model'], row['gates'], float(row['p']))
+                    float(row['error_uncoded']), float(row['error_coded'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                bases.setdefault(key, set()).add(row['basis'])
+    return {key for key, val in bases.items() if val >= {'Z', 'X'}}
+
+
+def drop_partial_row(path):
+
+    # Remove a row cut off mid-write so appended rows start on a fresh line
+    if os.path.exists(path):
+        with open(path, 'rb+') as f:
+            data = f.read()
+            if len(data) > 0 and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+
+def run_sweep(path, error_probs, models=('bit_flip', 'depolarizing'), codes=('three', 'five'),
+              shots=1024, max_workers=None, gates=()):
+
+    # Skip points finished by a previous (partial) run
+    drop_partial_row(path)
+    done = completed_points(path)
+    gates = tuple(gates)
+    points = [(code, model, float(p)) for code in codes for model in models for p in error_probs
+              if (code, model, ' '.join(gates), float(p)) not in done]
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+
+    # Distribute points over a process pool and stream rows as they complete
+    with open(path, 'a', newline='') as f, ProcessPoolExecutor(max_workers=max_workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+            f.flush()
+        futures = [pool.submit(simulate_point, code, model, p, shots, gates=gates) for code, model, p in points]
+        for future in as_completed(futures):
+            writer.writerows(future.result())
+            f.flush()
+    return len(points)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Logical error rate sweep for the QEC codes')
+    parser.add_argument('--output', default='threshold_sweep.csv')
+    parser.add_argument('--p-min', type=float, default=0.0)
+    parser.add_argument('--p-max', type=float, default=0.5)
+    parser.add_argument('--points', type=int, default=26)
+    parser.add_argument('--shots', type=int, default=8192)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--codes', nargs='+', default=list(CODES))
+    parser.add_argument('--models', nargs='+', default=['bit_flip', 'depolarizing'],
+                        help='noise channels from ' + ', '.join(NOISE_MODELS) + ', combined with +')
+    parser.add_argument('--gates', nargs='*', default=[], help='gates followed by the same noise channel')
+    args = parser.parse_args()
+    count = run_sweep(args.output, np.linspace(args.p_min, args.p_max, args.points), models=args.models,
+                      codes=args.codes, shots=args.shots, max_workers=args.workers, gates=args.gates)
+    print('Simulated ' + str(count) + ' points into ' + args.output)
@@ -1,11 +1,14 @@
+import math
 import random
 import numpy as np
 import matplotlib.pyplot as plt
 
-from qiskit import QuantumCircuit, Aer, execute
+from qiskit import QuantumCircuit, Aer, transpile, assemble
 from qiskit.circuit import ParameterVector
+from qiskit.circuit.library import XGate
 from qiskit.quantum_info import state_fidelity
 from qiskit.quantum_info import Statevector, DensityMatrix, Operator
+from estimator import stream
 
 
 class Compressor:
@@ -24,16 +27,33 @@ class Compressor:
         self.s0 = np.array([0, 0])
         self.s1 = np.array([0, 0])
         self.entropy = 1
+        self.spectrum = np.array([1.0, 0.0])
         self.initialize_density_matrix()
         self.noise = ParameterVector('noise', length=self.m)
 
-        # Build subcircuits
+        # Build subcircuits (transmitter and receiver on first use)
         self.ns_ckt = QuantumCircuit(self.n, name='$Noise$')
         self.source = QuantumCircuit(self.n, name='$Src$')
-        self.tx_ckt = QuantumCircuit(self.n, name='$Tx$')
-        self.rx_ckt = QuantumCircuit(self.n, name='$Rx$')
+        self._tx_ckt = None
+        self._rx_ckt = None
         self.initialize_subcircuits()
 
+        # Initialize transpilation cache
+        self.transpiled = {}
+        self.cache_info = {'hits': 0, 'misses': 0}
+
+    @property
+    def tx_ckt(self):
+        if self._tx_ckt is None:
+            self._tx_ckt = self.build_transmitter()
+        return self._tx_ckt
+
+    @property
+    def rx_ckt(self):
+        if self._rx_ckt is None:
+            self._rx_ckt = self.build_receiver()
+        return self._rx_ckt
+
     def initialize_density_matrix(self):
 
         # Evaluate density matrix and list of states
@@ -58,6 +78,7 @@ class Compressor:
             self.s0 = s1
             self.s1 = s0
         self.entropy = -np.real(sum([p * np.log2(p) for p in v]))
+        self.spectrum = np.sort(np.clip(np.real(v), 0, 1))[::-1]
         self.m = int(np.ceil(self.entropy * self.n))
 
     def initialize_subcircuits(self):
@@ -69,52 +90,198 @@ class Compressor:
             self.source.rz(self.phi[i], i)
 
         # Build typical basis change operator
-        U = Operator(np.column_stack((self.s0.data, self.s1.data))).adjoint()
-        for i in range(self.n):
-            self.tx_ckt.unitary(U, [i], label='$Basis$')
-
-        # Build permutation operator
-        data = list(range(2 ** self.n))
-        data = [("{0:0" + str(self.n) + "b}").format(i) for i in data]
-        data = sorted(data, key=lambda x: x.count('1'))
-        data = [int(x, 2) for x in data]
-        V = np.zeros((2 ** self.n, 2 ** self.n))
-        for i in range(2 ** self.n):
-            V[i, data[i]] = 1
-        self.tx_ckt.unitary(V, list(range(self.n)), label='$Perm$')
+        self.basis = Operator(np.column_stack((self.s0.data, self.s1.data))).adjoint().data
+
+        # Build permutation sorting basis states by Hamming weight (state perm[i] moves to i)
+        weights = np.array([bin(i).count('1') for i in range(2 ** self.n)])
+        self.perm = np.argsort(weights, kind='stable')
 
         # Build bit flip noisy channel
         for i in range(self.m):
             self.ns_ckt.u3(self.noise[i], 0, self.noise[i], i)
 
-        # Build receiver
-        self.rx_ckt.reset(range(self.m, self.n))
-        self.rx_ckt.append(self.tx_ckt.to_gate().inverse(), list(range(self.n)))
+    def build_transmitter(self):
 
-    def simulate(self, num_shots=1, bit_flip_prob=0.0):
+        # Change to the typical basis, then sort basis states by Hamming weight
+        circ = QuantumCircuit(self.n, name='$Tx$')
+        for i in range(self.n):
+            circ.unitary(Operator(self.basis), [i], label='$Basis$')
+        self.synthesize_permutation(circ)
+        return circ
+
+    def build_receiver(self):
+
+        # Reset discarded qubits and invert the transmitter
+        circ = QuantumCircuit(self.n, name='$Rx$')
+        circ.reset(range(self.m, self.n))
+        circ.append(self.tx_ckt.to_gate().inverse(), list(range(self.n)))
+        return circ
+
+    def synthesize_permutation(self, circ):
+
+        # Decompose the permutation into cycles of basis state transpositions
+        target = np.empty_like(self.perm)
+        target[self.perm] = np.arange(2 ** self.n)
+        visited = np.zeros(2 ** self.n, dtype=bool)
+        for start in range(2 ** self.n):
+            cycle = []
+            x = start
+            while not visited[x]:
+                visited[x] = True
+                cycle.append(x)
+                x = target[x]
+            for x in cycle[1:]:
+                self.transpose_states(circ, cycle[0], x)
+
+    def transpose_states(self, circ, a, b):
+
+        # Reduce the pair to states differing in a single qubit with CX gates
+        a, b = int(a), int(b)
+        diff = [i for i in range(self.n) if (a ^ b) >> i & 1]
+        t = diff[0]
+        for d in diff[1:]:
+            circ.cx(t, d)
+
+        # Swap the pair with an X controlled on the remaining qubits, then undo the reduction
+        base = a if a >> t & 1 == 0 else b
+        controls = [i for i in range(self.n) if i != t]
+        if len(controls) == 0:
+            circ.x(t)
+        else:
+            state = sum((base >> q & 1) << j for j, q in enumerate(controls))
+            circ.append(XGate().control(len(controls), ctrl_state=state), controls + [t])
+        for d in reversed(diff[1:]):
+            circ.cx(t, d)
+
+    def transpile_circuit(self, key, backend):
+
+        # Transpile the parametric source or full pipeline once per backend
+        if (key, backend.name()) in self.transpiled:
+            self.cache_info['hits'] += 1
+        else:
+            self.cache_info['misses'] += 1
+            if key == 'source':
+                circ = self.source
+            else:
+                circ = self.source + self.tx_ckt + self.ns_ckt + self.rx_ckt
+            self.transpiled[(key, backend.name())] = transpile(circ, backend)
+        return self.transpiled[(key, backend.name())]
+
+    def bind(self, circ, theta, phi, noise=()):
+
+        # Bind parameter values present in the circuit
+        values = dict(zip(self.theta, theta))
+        values.update(zip(self.phi, phi))
+        values.update(zip(self.noise, noise))
+        return circ.bind_parameters({k: v for k, v in values.items() if k in circ.parameters})
 
-        # Get backend and circuit
+    def fidelity_batch(self, theta, phi, noise):
+
+        # Bind every parameter set into the cached circuits
         simulator = Aer.get_backend('statevector_simulator')
-        circ = self.source + self.tx_ckt + self.ns_ckt + self.rx_ckt
-        fid_list = []
+        source = self.transpile_circuit('source', simulator)
+        full = self.transpile_circuit('full', simulator)
+        k = len(theta)
+        circs = [self.bind(source, theta[i], phi[i]) for i in range(k)]
+        circs += [self.bind(full, theta[i], phi[i], noise[i]) for i in range(k)]
 
-        for i in range(num_shots):
+        # Simulate all circuits in a single job
+        result = simulator.run(assemble(circs, simulator)).result()
+        return np.array([state_fidelity(result.get_statevector(i), result.get_statevector(k + i)) for i in range(k)])
 
-            # Acquire parameters
+    def simulate(self, num_shots=1, bit_flip_prob=0.0):
+
+        # Acquire parameters
+        theta, phi, noise = [], [], []
+        for i in range(num_shots):
             states = random.choices(list(self.ensemble.keys()), self.ensemble.values(), k=self.n)
-            noise = random.choices([0, np.pi], [1-bit_flip_prob, bit_flip_prob], k=self.m)
-            theta = [p[0] for p in states]
-            phi = [p[1] for p in states]
-            circ1 = self.source.bind_parameters({self.theta: theta, self.phi: phi})
-            circ2 = circ.bind_parameters({self.theta: theta, self.phi: phi, self.noise: noise})
+            noise.append(random.choices([0, np.pi], [1-bit_flip_prob, bit_flip_prob], k=self.m))
+            theta.append([p[0] for p in states])
+            phi.append([p[1] for p in states])
+
+        # Simulate and return results
+        return list(self.fidelity_batch(theta, phi, noise))
+
+    def product_states(self, index, basis=None):
+
+        # Build sampled product states from ensemble indices (qubit 0 least significant)
+        keys = np.array(list(self.ensemble.keys()), dtype=float)
+        theta, phi = keys[index, 0], keys[index, 1]
+        amps = np.stack((np.exp(-0.5j * phi) * np.cos(theta / 2), np.exp(0.5j * phi) * np.sin(theta / 2)), axis=-1)
+        if basis is not None:
+            amps = amps @ basis.T
+        psi = amps[:, 0]
+        for i in range(1, self.n):
+            psi = (amps[:, i, :, None] * psi[:, None, :]).reshape(len(index), -1)
+        return psi
+
+    def fidelity_numpy(self, size, bit_flip_prob, rng):
+
+        # Sample input states and bit flips
+        probs = np.array(list(self.ensemble.values()), dtype=float)
+        index = rng.choice(len(probs), size=(size, self.n), p=probs / probs.sum())
+        flips = (rng.random((size, self.m)) < bit_flip_prob) @ (2 ** np.arange(self.m))
+
+        # Transmit with the basis change applied per qubit before the product and the permutation as a gather
+        sent = self.product_states(index, self.basis)[:, self.perm]
+
+        # Apply bit flips on the first m qubits as an index gather
+        received = np.take_along_axis(sent, np.arange(2 ** self.n) ^ flips[:, None], axis=1)
+
+        # Average the reset over its outcomes, each moving one block of the received state onto the kept qubits
+        blocks = received.reshape(size, 2 ** (self.n - self.m), 2 ** self.m)
+        overlaps = blocks @ sent[:, :2 ** self.m, None].conj()
+        return np.sum(np.abs(overlaps[..., 0]) ** 2, axis=1)
+
+    def simulate_numpy(self, num_shots=1, bit_flip_prob=0.0, batch_size=None, seed=None):
+
+        # Simulate in batches of about 2^22 amplitudes
+        if batch_size is None:
+            batch_size = max(1, 2 ** 22 >> self.n)
+        rng = np.random.default_rng(seed)
+        fidelity = np.empty(num_shots)
+        for start in range(0, num_shots, batch_size):
+            size = min(batch_size, num_shots - start)
+            fidelity[start:start + size] = self.fidelity_numpy(size, bit_flip_prob, rng)
+        return fidelity
+
+    def simulate_stream(self, bit_flip_prob=0.0, precision=None, confidence=0.95, max_shots=10 ** 6,
+                        batch_size=None, seed=None):
+
+        # Yield running estimates in batches small enough for early stopping and at most about 2^22 amplitudes
+        if batch_size is None:
+            batch_size = max(1, min(1024, 2 ** 22 >> self.n))
+        rng = np.random.default_rng(seed)
+        return stream(lambda: self.fidelity_numpy(batch_size, bit_flip_prob, rng), precision=precision,
+                      confidence=confidence, max_count=max_shots, min_count=min(100, max_shots))
+
+    def fidelity_bound(self, bit_flip_prob=0.0, block_sizes=None, rate=None):
+
+        # Evaluate rate and fidelity lower bound for each block size without simulation (default rate is the entropy)
+        block_sizes = [self.n] if block_sizes is None else list(block_sizes)
+        rate = self.entropy if rate is None else rate
+        with np.errstate(divide='ignore'):
+            log0, log1 = np.log(self.spectrum)
+        rates, bounds = [], []
+        for n in block_sizes:
+            m = min(int(np.ceil(rate * n)), n)
 
-            # Simulate
-            ini_state = execute(circ1, simulator).result().get_statevector()
-            fin_state = execute(circ2, simulator).result().get_statevector()
-            fid_list.append(state_fidelity(ini_state, fin_state))
+            # Probability of the kept subspace, filled by Hamming classes in order of weight
+            prob, remaining = 0.0, 2 ** m
+            for k in range(n + 1):
+                count = min(math.comb(n, k), remaining)
+                if count == 0:
+                    break
+                if k == 0:
+                    prob += np.exp(math.log(count) + n * log0)
+                elif log1 > -np.inf:
+                    prob += np.exp(math.log(count) + (n - k) * log0 + k * log1)
+                remaining -= count
 
-        # Return results
-        return fid_list
+            # Entanglement fidelity of the error free branch, a lower bound (not an estimate) of the average fidelity
+            rates.append(m / n)
+            bounds.append((1 - bit_flip_prob) ** m * min(prob, 1.0) ** 2)
+        return np.array(block_sizes), np.array(rates), np.array(bounds)
 
     def visualize(self):
 
@@ -134,3 +301,11 @@ if __name__ == '__main__':
     fid2 = com.simulate(num_shots=100, bit_flip_prob=0.1)
     print('Noiseless System Fidelity: ', np.mean(fid1))
     print('Noisy (p = 0.1) System Fidelity: ', np.mean(fid2))
+    fid3 = com.simulate_numpy(num_shots=10**5, bit_flip_prob=0.1)
+    print('Noisy (p = 0.1) System Fidelity (10^5 shots): ', np.mean(fid3))
+    for estimate in com.simulate_stream(bit_flip_prob=0.1, precision=0.001):
+        pass
+    low, high = estimate.interval()
+    print('Noisy (p = 0.1) System Fidelity (streamed): ', estimate.mean, 'in', (low, high), 'after', estimate.count)
+    for n, rate, bound in zip(*com.fidelity_bound(block_sizes=[10, 100, 500])):
+        print('Block Size:', n, 'Rate:', rate, 'Noiseless Fidelity Lower Bound:', bound)
@@ -0,0 +1,74 @@
+import numpy as np
+from statistics import NormalDist
+
+
+class RunningEstimator:
+
+    def __init__(self, shape=()):
+
+        # Initialize running moments (O(1) memory in the number of samples)
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def merge(self, count, mean, m2):
+
+        # Combine with moments of another set of samples (Chan et al. parallel update)
+        if count == 0:
+            return self
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        return self
+
+    def update(self, values):
+
+        # Add a batch of samples stacked along the first axis
+        values = np.asarray(values, dtype=float).reshape((-1,) + self.mean.shape)
+        if len(values) == 0:
+            return self
+        mean = values.mean(axis=0)
+        return self.merge(len(values), mean, np.sum((values - mean) ** 2, axis=0))
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return np.full(self.mean.shape, np.inf)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def sem(self):
+        return np.sqrt(self.variance / max(self.count, 1))
+
+    def interval(self, confidence=0.95, method='normal'):
+
+        # Normal approximation interval, or Wilson score interval for proportions (stays wide when no events occur)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        if method == 'wilson':
+            n = max(self.count, 1)
+            scale = 1 + z ** 2 / n
+            center = (self.mean + z ** 2 / (2 * n)) / scale
+            half = z / scale * np.sqrt(np.clip(self.mean * (1 - self.mean), 0, None) / n + z ** 2 / (4 * n ** 2))
+            return center - half, center + half
+        if method != 'normal':
+            raise ValueError('Unknown interval method: ' + str(method))
+        return self.mean - z * self.sem, self.mean + z * self.sem
+
+    def converged(self, precision, confidence=0.95, method='normal'):
+
+        # Check whether every interval half width is within precision
+        low, high = self.interval(confidence, method)
+        return self.count >= 2 and np.max(high - low) / 2 <= precision
+
+
+def stream(sampler, precision=None, confidence=0.95, max_count=None, min_count=100, shape=(), method='normal'):
+
+    # Feed batches from sampler into a running estimator, yield after each batch and stop once precise enough
+    estimator = RunningEstimator(shape)
+    while max_count is None or estimator.count < max_count:
+        estimator.update(sampler())
+        yield estimator
+        if precision is not None and estimator.count >= min_count and estimator.converged(precision, confidence, method):
+            return
@@ -0,0 +1,82 @@
+"""Cold Import Time Budgets for the Component Modules"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+# Module folder, module name, reference import and budget in seconds for the module's own import on top
+# of the reference. On qiskit 0.23.6 (terra 0.16.4) 'import qiskit' itself loads Aer, IBMQ, visualization,
+# pyplot and Aqua (2.2-2.7 s on a single core Linux VM), so lazy loading in these modules cannot shorten a
+# cold start. The check is a regression gate instead: budgets sit a few milliseconds above the own import
+# times measured with --repeat 5 (in the comments) and catch any new heavy import.
+BUDGETS = [
+    ('HHL Algorithm', 'hhl_components', 'qiskit', 0.02),               # 0.008 s
+    ('QAOA Algorithm', 'qaoa_components', 'qiskit', 0.02),             # 0.008 s
+    ('QAOA Algorithm', 'parameter_store', 'numpy', 0.01),              # 0.002 s
+    ('Schumacher Compression', 'compressor', 'qiskit', 0.02),          # 0.007 s
+    ('Quantum Error Correction', 'three_qubit_code', 'qiskit', 0.01),  # 0.001 s
+    ('Quantum Error Correction', 'five_qubit_code', 'qiskit', 0.01),   # 0.002 s
+    ('Quantum Error Correction', 'noise', 'qiskit', 0.01),             # 0.001 s
+    ('Quantum Error Correction', 'pauli_frame', 'numpy', 0.02),        # 0.007 s
+    ('Quantum Error Correction', 'estimator', 'numpy', 0.01),          # 0.004 s
+    ('Quantum Error Correction', 'fidelity_sweep', 'qiskit', 0.01),    # 0.001 s
+    ('Quantum Error Correction', 'threshold_sweep', 'qiskit', 0.02),   # 0.008 s
+]
+
+# Modules that should only load on first use
+HEAVY = ['matplotlib.pyplot', 'qiskit.aqua', 'qiskit.visualization', 'qiskit.providers.aer',
+         'qiskit.providers.ibmq']
+
+# Heavy modules each reference import already loads (the known eager baseline)
+EAGER = {'numpy': [], 'qiskit': HEAVY}
+
+PROBE = """import sys, time
+start = time.perf_counter()
+import {base}
+middle = time.perf_counter()
+import {module}
+end = time.perf_counter()
+print(middle - start)
+print(end - middle)
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure(folder, module, base, repeat=3):
+
+    # Import the reference then the module in fresh interpreters from its folder and keep the fastest runs
+    root = os.path.dirname(os.path.abspath(__file__))
+    best_base, best, heavy = float('inf'), float('inf'), ''
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(base=base, module=module, heavy=HEAVY)],
+                                cwd=os.path.join(root, folder), capture_output=True, text=True)
+        if output.returncode != 0:
+            return None, None, output.stderr.strip().splitlines()[-1]
+        lines = output.stdout.splitlines()
+        best_base = min(best_base, float(lines[0]))
+        best = min(best, float(lines[1]))
+        heavy = lines[2] if len(lines) > 2 else ''
+    return best_base, best, heavy
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check cold import times against per-module budgets')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier applied to every budget')
+    args = parser.parse_args()
+
+    # Fail on own import time over budget, or on heavy modules beyond the reference's eager baseline
+    failed = 0
+    for folder, module, base, budget in BUDGETS:
+        base_time, elapsed, heavy = measure(folder, module, base, args.repeat)
+        if elapsed is None:
+            failed += 1
+            print('{:<4} {:<18} {}'.format('ERR', module, heavy))
+            continue
+        extra = [m for m in heavy.split(',') if m and m not in EAGER[base]]
+        status = 'PASS' if elapsed <= budget * args.scale and not extra else 'FAIL'
+        failed += status == 'FAIL'
+        print('{:<4} {:<18} {:6.3f}s / {:5.3f}s  (+ {} {:.3f}s)  {}'.format(
+            status, module, elapsed, budget * args.scale, base, base_time, 'eager: ' + ','.join(extra) if extra else ''))
+    sys.exit(1 if failed else 0)